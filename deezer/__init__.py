@@ -1,3 +1,10 @@
-from deezer.server import app
-
 __all__ = ["app"]
+
+
+def __getattr__(name: str):
+    # Imported lazily so that `deezer.cli` and worker processes don't build the whole app
+    if name == "app":
+        from deezer.server import app
+
+        return app
+    raise AttributeError(f"module 'deezer' has no attribute {name!r}")
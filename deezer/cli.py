@@ -0,0 +1,118 @@
+"""
+Decrypts and tags archived CDN payloads in bulk, without going through the API.
+
+Usage: python -m deezer.cli manifest.jsonl [--output-dir DIR] [--workers N]
+
+Each line of the manifest is a JSON object with the track `id` and the `input` path of the encrypted payload. It can also have an `output` path (defaults to the input path with an `.mp3` suffix, or the same file name in `--output-dir`, and never the input itself), the `song.getData` results as `track_info` to write ID3 tags, and a `cover` path to a JPEG to embed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional, Tuple
+
+from deezer.core.blowfish import (
+    STRIPE_SIZE,
+    decrypt_stripes,
+    generate_blowfish_key,
+)
+from deezer.core.id3 import build_id3_tag
+
+
+def output_path(job: dict, output_dir: Optional[str]) -> Path:
+    if job.get("output"):
+        return Path(job["output"])
+    if output_dir:
+        return Path(output_dir) / Path(job["input"]).with_suffix(".mp3").name
+    return Path(job["input"]).with_suffix(".mp3")
+
+
+def process_file(job: dict, output_dir: Optional[str], batch_stripes: int) -> int:
+    blowfish_key = generate_blowfish_key(str(job["id"]))
+
+    header = b""
+    if job.get("track_info"):
+        album_art = None
+        if job.get("cover"):
+            album_art = Path(job["cover"]).read_bytes()
+        header = build_id3_tag(job["track_info"], album_art)
+
+    output = output_path(job, output_dir)
+    if output.resolve() == Path(job["input"]).resolve():
+        raise ValueError(f"The output {output} would overwrite the input")
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    # Written next to the output first, so a failed run never leaves a truncated file behind
+    partial = output.with_name(output.name + ".part")
+    processed = 0
+    try:
+        with open(job["input"], "rb") as source, open(partial, "wb") as destination:
+            destination.write(header)
+            while True:
+                data = source.read(STRIPE_SIZE * batch_stripes)
+                if not data:
+                    break
+                destination.write(decrypt_stripes(data, blowfish_key))
+                processed += len(data)
+        os.replace(partial, output)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+    return processed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Decrypt and tag archived Deezer CDN payloads."
+    )
+    parser.add_argument("manifest", help="JSON lines file, one track per line")
+    parser.add_argument("--output-dir", help="Directory for the decrypted files")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes (defaults to the number of CPUs)",
+    )
+    parser.add_argument(
+        "--batch-stripes",
+        type=int,
+        default=256,
+        help="6144 byte stripes read and decrypted at a time",
+    )
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        jobs = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    processed, failed = 0, 0
+    with ProcessPoolExecutor(args.workers) as executor:
+        futures = {
+            executor.submit(process_file, job, args.output_dir, args.batch_stripes): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                processed += future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Failed to process {job.get('input')}: {e!r}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Processed {len(jobs) - failed}/{len(jobs)} files, {processed / 1048576:.1f} MiB "
+        f"in {elapsed:.1f}s ({processed / 1048576 / max(elapsed, 1e-9):.1f} MiB/s, "
+        f"{(len(jobs) - failed) / max(elapsed, 1e-9):.1f} files/s)"
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
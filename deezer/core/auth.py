@@ -6,6 +6,11 @@ from fastapi.security.api_key import APIKeyHeader
 
 from deezer.core.config import auth_key
 
+if not auth_key:
+    print(
+        "DEEZER_AUTH_KEY is not set, allowing all requests. Do not use this in an environment where the port is exposed."
+    )
+
 api_key_header_auth = APIKeyHeader(
     name="Authorization",
     description="Mandatory Authorization, required for all endpoints",
@@ -4,6 +4,10 @@ from Cryptodome.Cipher import Blowfish
 
 from deezer.core.config import master_key
 
+# Tracks are encrypted in stripes of three 2048 byte chunks, where only the first chunk of each stripe is encrypted
+CHUNK_SIZE = 2048
+STRIPE_SIZE = CHUNK_SIZE * 3
+
 
 def generate_blowfish_key(track_id: int) -> bytes:
     m = hashlib.md5()
@@ -25,3 +29,15 @@ def generate_blowfish_key(track_id: int) -> bytes:
 def decrypt_chunk(data: bytes, blowfish_key: bytes) -> bytes:
     cipher = Blowfish.new(blowfish_key, Blowfish.MODE_CBC, bytes([i for i in range(8)]))
     return cipher.decrypt(data)
+
+
+def decrypt_stripes(data: bytes, blowfish_key: bytes) -> bytes:
+    """
+    Decrypts a run of stripes that starts on a stripe boundary. A first chunk shorter than `CHUNK_SIZE` is left as is, as it's the end of the track.
+    """
+    data = bytearray(data)
+    for offset in range(0, len(data) - CHUNK_SIZE + 1, STRIPE_SIZE):
+        data[offset : offset + CHUNK_SIZE] = decrypt_chunk(
+            data[offset : offset + CHUNK_SIZE], blowfish_key
+        )
+    return bytes(data)
@@ -0,0 +1,213 @@
+import time
+from typing import List, Optional, Tuple
+
+from deezer.core.config import (
+    audio_cache_budget,
+    metadata_cache_budget,
+    negative_cache_budget,
+)
+from deezer.core.redis import redis
+from deezer.core.timing import span
+
+# Every script's KEYS start with the namespace's sizes hash, frequencies hash,
+# priorities zset, stats hash and expiries zset (member -> unix time it expires at)
+ACCOUNTING = """
+local function forget(member)
+    local size = redis.call("HGET", KEYS[1], member)
+    redis.call("HDEL", KEYS[1], member)
+    redis.call("HDEL", KEYS[2], member)
+    redis.call("ZREM", KEYS[3], member)
+    redis.call("ZREM", KEYS[5], member)
+    if size then
+        return redis.call("HINCRBY", KEYS[4], "bytes", -tonumber(size))
+    end
+end
+
+-- Entries that expire by TTL and are never read again would otherwise stay counted
+local function sweep(prefix, now, limit)
+    local due = redis.call("ZRANGEBYSCORE", KEYS[5], "-inf", now, "LIMIT", 0, limit)
+    for _, member in ipairs(due) do
+        local ttl = redis.call("PTTL", prefix .. member)
+        if ttl > 0 then
+            redis.call("ZADD", KEYS[5], now + ttl / 1000, member)
+        elseif ttl == -1 then
+            redis.call("ZREM", KEYS[5], member)
+        else
+            forget(member)
+        end
+    end
+end
+"""
+
+# KEYS: accounting keys, data key
+# ARGV: member, value, ttl, budget, data key prefix, now
+SET_SCRIPT = ACCOUNTING + """
+sweep(ARGV[5], tonumber(ARGV[6]), 64)
+
+local size = string.len(ARGV[2])
+local previous = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or 0)
+if tonumber(ARGV[3]) > 0 then
+    redis.call("SET", KEYS[6], ARGV[2], "EX", ARGV[3])
+    redis.call("ZADD", KEYS[5], tonumber(ARGV[6]) + tonumber(ARGV[3]), ARGV[1])
+else
+    redis.call("SET", KEYS[6], ARGV[2])
+    redis.call("ZREM", KEYS[5], ARGV[1])
+end
+redis.call("HSET", KEYS[1], ARGV[1], size)
+local used = redis.call("HINCRBY", KEYS[4], "bytes", size - previous)
+local frequency = redis.call("HINCRBY", KEYS[2], ARGV[1], 1)
+local clock = tonumber(redis.call("HGET", KEYS[4], "clock") or 0)
+redis.call("ZADD", KEYS[3], clock + frequency / math.max(size, 1), ARGV[1])
+
+local budget = tonumber(ARGV[4])
+while budget > 0 and used > budget do
+    local victim = redis.call("ZRANGE", KEYS[3], 0, 0, "WITHSCORES")
+    if #victim == 0 then
+        break
+    end
+    redis.call("DEL", ARGV[5] .. victim[1])
+    redis.call("HSET", KEYS[4], "clock", victim[2])
+    redis.call("HINCRBY", KEYS[4], "evictions", 1)
+    used = forget(victim[1]) or used
+end
+return used
+"""
+
+# KEYS: accounting keys, data keys...
+# ARGV: members...
+GET_SCRIPT = ACCOUNTING + """
+local values = redis.call("MGET", (table.unpack or unpack)(KEYS, 6))
+local clock = tonumber(redis.call("HGET", KEYS[4], "clock") or 0)
+for i = 1, #ARGV do
+    local value = values[i]
+    if value then
+        redis.call("HINCRBY", KEYS[4], "hits", 1)
+        local frequency = redis.call("HINCRBY", KEYS[2], ARGV[i], 1)
+        redis.call("ZADD", KEYS[3], clock + frequency / math.max(string.len(value), 1), ARGV[i])
+    else
+        redis.call("HINCRBY", KEYS[4], "misses", 1)
+        forget(ARGV[i])
+    end
+end
+return values
+"""
+
+# KEYS: accounting keys
+# ARGV: data key prefix, now
+SWEEP_SCRIPT = ACCOUNTING + """
+sweep(ARGV[1], tonumber(ARGV[2]), -1)
+"""
+
+set_script = redis.register_script(SET_SCRIPT)
+get_script = redis.register_script(GET_SCRIPT)
+sweep_script = redis.register_script(SWEEP_SCRIPT)
+
+
+class CacheStore:
+    """
+    A namespaced slice of Redis with its own byte budget.
+
+    Every entry's size is tracked next to it, and once the namespace goes over
+    its budget the entries with the lowest GreedyDual-Size-Frequency priority
+    are evicted first. Large, rarely requested entries go before small, popular
+    ones, and one namespace filling up never pushes out another's keys.
+    A budget of 0 disables eviction but still tracks usage. Entries that expire
+    by TTL are dropped from the accounting on the next write or usage check.
+    """
+
+    def __init__(self, namespace: str, budget: int) -> None:
+        self.namespace = namespace
+        self.budget = budget
+        self.prefix = f"{namespace}:"
+        self.accounting_keys = [
+            f"cache:{namespace}:sizes",
+            f"cache:{namespace}:frequencies",
+            f"cache:{namespace}:priorities",
+            f"cache:{namespace}:stats",
+            f"cache:{namespace}:expiries",
+        ]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Gets several entries with one `MGET`, in the same order as `keys`.
+        """
+        if not keys:
+            return []
+        with span("redis"):
+            values = await get_script(
+                keys=[*self.accounting_keys, *[self.prefix + key for key in keys]],
+                args=keys,
+            )
+        return [value or None for value in values]
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        await self.set_many([(key, value, ex)])
+
+    async def set_many(self, entries: List[Tuple[str, bytes, Optional[int]]]) -> None:
+        """
+        Sets several `(key, value, ex)` entries in one round trip.
+        """
+        if not entries:
+            return
+        with span("redis"):
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, value, ex in entries:
+                    await set_script(
+                        keys=[*self.accounting_keys, self.prefix + key],
+                        args=[
+                            key,
+                            value,
+                            ex or 0,
+                            self.budget,
+                            self.prefix,
+                            time.time(),
+                        ],
+                        client=pipe,
+                    )
+                await pipe.execute()
+
+    async def expire(self, key: str, ex: int) -> None:
+        await self.expire_many([key], ex)
+
+    async def expire_many(self, keys: List[str], ex: int) -> None:
+        if not keys:
+            return
+        expiries = self.accounting_keys[4]
+        with span("redis"):
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.expire(self.prefix + key, ex)
+                    pipe.zadd(expiries, {key: time.time() + ex})
+                await pipe.execute()
+
+    async def usage(self) -> dict:
+        sizes, _, _, stats, _ = self.accounting_keys
+        async with redis.pipeline(transaction=False) as pipe:
+            await sweep_script(
+                keys=self.accounting_keys,
+                args=[self.prefix, time.time()],
+                client=pipe,
+            )
+            pipe.hlen(sizes)
+            pipe.hgetall(stats)
+            _, entries, stats = await pipe.execute()
+        return {
+            "namespace": self.namespace,
+            "budget": self.budget,
+            "bytes": int(stats.get(b"bytes", 0)),
+            "entries": entries,
+            "evictions": int(stats.get(b"evictions", 0)),
+            "hits": int(stats.get(b"hits", 0)),
+            "misses": int(stats.get(b"misses", 0)),
+        }
+
+
+metadata = CacheStore("metadata", metadata_cache_budget)
+audio = CacheStore("audio", audio_cache_budget)
+# Lookups that found nothing upstream, kept apart so they can't evict real entries
+negative = CacheStore("negative", negative_cache_budget)
+
+stores = [metadata, audio, negative]
@@ -0,0 +1,50 @@
+import gzip
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from deezer.core.config import compression_level
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def compress(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=compression_level, mtime=0)
+
+
+def decompress(data: bytes) -> bytes:
+    if data[:2] != GZIP_MAGIC:
+        return data  # Entries cached before compression was added are plain JSON
+    return gzip.decompress(data)
+
+
+def accepts_gzip(request: Request) -> bool:
+    for encoding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = encoding.strip().partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def encoded_response(
+    request: Request, data: bytes, media_type: str = "application/json"
+) -> Response:
+    """
+    Sends a cached payload, passing the compressed bytes straight through when the client accepts gzip.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if data[:2] == GZIP_MAGIC:
+        if accepts_gzip(request):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            data = gzip.decompress(data)
+    return Response(
+        content=data, status_code=200, media_type=media_type, headers=headers
+    )
@@ -1,10 +1,6 @@
 import os
 
 auth_key = os.getenv("DEEZER_AUTH_KEY")
-if not auth_key:
-    print(
-        "DEEZER_AUTH_KEY is not set, allowing all requests. Do not use this in an environment where the port is exposed."
-    )
 
 master_key = os.getenv("DEEZER_MASTER_KEY")
 if not master_key:
@@ -17,3 +13,48 @@ redis_url = os.getenv("DEEZER_REDIS_URL", "redis://localhost:6379/0")
 search_ttl = int(os.getenv("DEEZER_SEARCH_TTL", 10800))
 search_suggestions_ttl = int(os.getenv("DEEZER_SUGGESTIONS_TTL", 86400))
 track_lyrics_ttl = int(os.getenv("DEEZER_TRACK_LYRICS_TTL", 43200))
+track_data_ttl = int(os.getenv("DEEZER_TRACK_DATA_TTL", 3600))
+
+compression_level = int(os.getenv("DEEZER_COMPRESSION_LEVEL", 6))
+
+metadata_cache_budget = int(os.getenv("DEEZER_METADATA_CACHE_BUDGET", 268435456))
+audio_cache_budget = int(os.getenv("DEEZER_AUDIO_CACHE_BUDGET", 1073741824))
+negative_cache_budget = int(os.getenv("DEEZER_NEGATIVE_CACHE_BUDGET", 16777216))
+negative_ttl = int(os.getenv("DEEZER_NEGATIVE_TTL", 300))
+
+session_ttl = int(os.getenv("DEEZER_SESSION_TTL", 3600))
+redis_warm_connections = int(os.getenv("DEEZER_REDIS_WARM_CONNECTIONS", 4))
+warmup_queries = [
+    query.strip()
+    for query in os.getenv("DEEZER_WARMUP_QUERIES", "").split(",")
+    if query.strip()
+]
+
+slow_request_threshold = int(os.getenv("DEEZER_SLOW_REQUEST_THRESHOLD", 1000))
+otel_enabled = os.getenv("DEEZER_OTEL_ENABLED", "").lower() in ("1", "true", "yes")
+
+worker_pool = os.getenv("DEEZER_WORKER_POOL", "thread").lower()
+if worker_pool not in ("thread", "process", "none"):
+    print(f"DEEZER_WORKER_POOL must be thread, process or none, not {worker_pool}.")
+    worker_pool = "thread"
+worker_count = int(os.getenv("DEEZER_WORKER_COUNT", os.cpu_count() or 1))
+worker_queue = int(os.getenv("DEEZER_WORKER_QUEUE", worker_count * 4))
+decrypt_batch_stripes = int(os.getenv("DEEZER_DECRYPT_BATCH_STRIPES", 32))
+
+http2_enabled = os.getenv("DEEZER_HTTP2", "true").lower() in ("1", "true", "yes")
+http_max_connections = int(os.getenv("DEEZER_HTTP_MAX_CONNECTIONS", 100))
+http_max_keepalive = int(os.getenv("DEEZER_HTTP_MAX_KEEPALIVE", 20))
+http_keepalive_expiry = float(os.getenv("DEEZER_HTTP_KEEPALIVE_EXPIRY", 60))
+dns_ttl = int(os.getenv("DEEZER_DNS_TTL", 300))
+
+search_admission_threshold = int(os.getenv("DEEZER_SEARCH_ADMISSION_THRESHOLD", 2))
+admission_window = int(os.getenv("DEEZER_ADMISSION_WINDOW", 3600))
+sketch_width = int(os.getenv("DEEZER_SKETCH_WIDTH", 16384))
+sketch_depth = int(os.getenv("DEEZER_SKETCH_DEPTH", 4))
+audio_admission_threshold = int(os.getenv("DEEZER_AUDIO_ADMISSION_THRESHOLD", 2))
+audio_admission_window = int(os.getenv("DEEZER_AUDIO_ADMISSION_WINDOW", 86400))
+audio_max_entry_size = int(os.getenv("DEEZER_AUDIO_MAX_ENTRY_SIZE", 20971520))
+
+typeahead_debounce = int(os.getenv("DEEZER_TYPEAHEAD_DEBOUNCE", 150))
+
+bulk_lyrics_limit = int(os.getenv("DEEZER_BULK_LYRICS_LIMIT", 100))
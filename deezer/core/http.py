@@ -0,0 +1,137 @@
+import asyncio
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+from httpcore.backends.auto import AutoBackend
+
+from deezer.core.config import (
+    dns_ttl,
+    http2_enabled,
+    http_keepalive_expiry,
+    http_max_connections,
+    http_max_keepalive,
+)
+
+try:
+    import h2  # httpx needs it for HTTP/2
+except ImportError:
+    h2 = None
+    if http2_enabled:
+        print("DEEZER_HTTP2 is set, but h2 is not installed. Using HTTP/1.1 instead.")
+
+
+class CachingDNSBackend(AutoBackend):
+    """
+    Resolves each host once per `DEEZER_DNS_TTL` seconds instead of on every new connection. TLS still uses the hostname, so certificates are verified as usual.
+    """
+
+    def __init__(self) -> None:
+        self.addresses: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        cached = self.addresses.get((host, port))
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        results = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+        addresses = list(dict.fromkeys(result[4][0] for result in results))
+        self.addresses[(host, port)] = (time.monotonic() + dns_ttl, addresses)
+        return addresses
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+    ) -> httpcore.backends.base.AsyncNetworkStream:
+        addresses = await self.resolve(host, port)
+        for address in addresses[:-1]:
+            try:
+                return await super().connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address
+                )
+            except httpcore.ConnectError:
+                continue
+        return await super().connect_tcp(
+            addresses[-1], port, timeout=timeout, local_address=local_address
+        )
+
+
+class HTTPPools:
+    """
+    The application's connections to Deezer, with one pool per upstream so a burst of CDN downloads can't starve the API calls.
+
+    Connections are kept alive between requests and use HTTP/2 where the host supports it.
+    """
+
+    def __init__(self) -> None:
+        self.dns = CachingDNSBackend()
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    def client(self, name: str) -> httpx.AsyncClient:
+        if name not in self.clients:
+            transport = httpx.AsyncHTTPTransport(
+                http2=http2_enabled and h2 is not None,
+                limits=httpx.Limits(
+                    max_connections=http_max_connections,
+                    max_keepalive_connections=http_max_keepalive,
+                    keepalive_expiry=http_keepalive_expiry,
+                ),
+            )
+            # httpx doesn't expose httpcore's network backend, so the resolver is set on the pool directly
+            transport._pool._network_backend = self.dns
+            self.clients[name] = httpx.AsyncClient(transport=transport)
+        return self.clients[name]
+
+    @property
+    def gateway(self) -> httpx.AsyncClient:
+        return self.client("gateway")  # www.deezer.com
+
+    @property
+    def api(self) -> httpx.AsyncClient:
+        return self.client("api")  # api.deezer.com
+
+    @property
+    def media(self) -> httpx.AsyncClient:
+        return self.client("media")  # media.deezer.com
+
+    @property
+    def cdn(self) -> httpx.AsyncClient:
+        return self.client("cdn")  # Audio CDN
+
+    @property
+    def images(self) -> httpx.AsyncClient:
+        return self.client("images")  # Image CDN
+
+    def usage(self) -> List[dict]:
+        usage = []
+        for name, client in self.clients.items():
+            pool = getattr(client._transport, "_pool", None)
+            connections = pool.connections if pool else []
+            idle = sum(connection.is_idle() for connection in connections)
+            usage.append(
+                {
+                    "name": name,
+                    "max_connections": http_max_connections,
+                    "connections": len(connections),
+                    "active": len(connections) - idle,
+                    "idle": idle,
+                    "http2": sum(
+                        "HTTP/2" in connection.info() for connection in connections
+                    ),
+                }
+            )
+        return usage
+
+    async def close(self) -> None:
+        clients, self.clients = self.clients, {}
+        await asyncio.gather(*[client.aclose() for client in clients.values()])
+
+
+pools = HTTPPools()
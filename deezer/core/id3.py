@@ -0,0 +1,29 @@
+from io import BytesIO
+from typing import Optional
+
+from mutagen.id3 import APIC, ID3, TALB, TDRC, TIT2, TPE1, TRCK
+
+
+def build_id3_tag(track_info: dict, album_art: Optional[bytes] = None) -> bytes:
+    song_name = track_info["SNG_TITLE"]
+    artist_name = track_info["ART_NAME"]
+    album_name = track_info["ALB_TITLE"]
+    track_number = track_info["TRACK_NUMBER"]  # It's a string
+    release_date = track_info["PHYSICAL_RELEASE_DATE"]  # YYYY-MM-DD format
+
+    audio = ID3()
+    audio.add(TIT2(encoding=3, text=song_name))
+    audio.add(TPE1(encoding=3, text=artist_name))
+    audio.add(TALB(encoding=3, text=album_name))
+    audio.add(TRCK(encoding=3, text=track_number))
+    audio.add(TDRC(encoding=3, text=release_date))
+
+    if album_art:
+        audio.add(
+            APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=album_art)
+        )
+
+    header = BytesIO()
+    audio.save(header, v2_version=3)
+
+    return header.getvalue()
@@ -0,0 +1,41 @@
+import hashlib
+import time
+
+from deezer.core.redis import redis
+from deezer.core.timing import span
+
+
+class FrequencySketch:
+    """
+    A count-min sketch in Redis that estimates how often an item has been seen in the current window, shared by every worker.
+
+    Counts start over each window (TinyLFU's reset, done by letting the window's hash expire), so items that were popular a while ago don't keep being admitted.
+    """
+
+    def __init__(self, name: str, width: int, depth: int, window: int) -> None:
+        self.name = name
+        self.width = width
+        self.depth = min(depth, 16)  # blake2b digests are at most 64 bytes
+        self.window = window
+
+    def counters(self, item: str) -> list:
+        digest = hashlib.blake2b(
+            item.encode("utf8"), digest_size=4 * self.depth
+        ).digest()
+        return [
+            f"{row}:{int.from_bytes(digest[row * 4 : row * 4 + 4], 'little') % self.width}"
+            for row in range(self.depth)
+        ]
+
+    async def increment(self, item: str) -> int:
+        """
+        Records a sighting of `item` and returns the estimated number of sightings in this window, including this one.
+        """
+        key = f"sketch:{self.name}:{int(time.time() // self.window)}"
+        with span("redis"):
+            async with redis.pipeline(transaction=False) as pipe:
+                for counter in self.counters(item):
+                    pipe.hincrby(key, counter, 1)
+                pipe.expire(key, self.window)
+                results = await pipe.execute()
+        return min(results[:-1])
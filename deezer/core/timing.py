@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from deezer.core.config import otel_enabled, slow_request_threshold
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+logger = logging.getLogger("deezer.timing")
+
+tracer = trace.get_tracer("deezer") if trace and otel_enabled else None
+if otel_enabled and not tracer:
+    print("DEEZER_OTEL_ENABLED is set, but opentelemetry-api is not installed.")
+
+# Stage name -> [total milliseconds, count] for the current request
+request_spans: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar(
+    "request_spans", default=None
+)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Times a stage of the current request. Stages with the same name are summed, so a span can wrap work that runs many times per request, like decrypting chunks.
+    """
+    spans = request_spans.get()
+    if spans is None and tracer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        if tracer:
+            with tracer.start_as_current_span(name):
+                yield
+        else:
+            yield
+    finally:
+        if spans is not None:
+            stage = spans.setdefault(name, [0.0, 0])
+            stage[0] += (time.perf_counter() - start) * 1000
+            stage[1] += 1
+
+
+def server_timing(spans: Dict[str, List[float]], total: float) -> str:
+    metrics = [f"{name};dur={duration:.1f}" for name, (duration, _) in spans.items()]
+    metrics.append(f"total;dur={total:.1f}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a `Server-Timing` header with the time spent in each stage of a request, and logs requests slower than `DEEZER_SLOW_REQUEST_THRESHOLD` milliseconds.
+
+    Stages can overlap (the CDN stream includes decrypting it), so they don't add up to the total. The header is sent before streamed bodies, so it only covers the stages finished by then, while the log line covers the whole request.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: Dict[str, List[float]] = {}
+        token = request_spans.set(spans)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(spans, total))
+            await send(message)
+
+        try:
+            if tracer:
+                with tracer.start_as_current_span(f"{scope['method']} {scope['path']}"):
+                    await self.app(scope, receive, send_with_timing)
+            else:
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            request_spans.reset(token)
+            total = (time.perf_counter() - start) * 1000
+            if total >= slow_request_threshold:
+                logger.warning(
+                    json.dumps(
+                        {
+                            "event": "slow_request",
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "status": status_code,
+                            "duration_ms": round(total, 1),
+                            "stages": {
+                                name: {
+                                    "duration_ms": round(duration, 1),
+                                    "count": count,
+                                }
+                                for name, (duration, count) in spans.items()
+                            },
+                        }
+                    )
+                )
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from deezer.core.config import worker_count, worker_pool, worker_queue
+
+T = TypeVar("T")
+
+
+class WorkerPool:
+    """
+    Runs CPU bound work (decryption, building ID3 tags) off the event loop, so cheap requests aren't stalled by downloads.
+
+    `DEEZER_WORKER_POOL` picks `thread` (PyCryptodome releases the GIL while decrypting), `process` or `none` to run on the loop like before. At most `DEEZER_WORKER_QUEUE` jobs are queued at once, further callers wait for a slot.
+    """
+
+    def __init__(self) -> None:
+        self.executor: Optional[Executor] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            if worker_pool == "process":
+                self.executor = ProcessPoolExecutor(worker_count)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    worker_count, thread_name_prefix="deezer-worker"
+                )
+        return self.executor
+
+    async def run(self, function: Callable[..., T], *args) -> T:
+        if worker_pool == "none":
+            return function(*args)
+
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(worker_queue)
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.get_executor(), function, *args
+            )
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+workers = WorkerPool()
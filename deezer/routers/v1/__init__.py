@@ -3,5 +3,7 @@ from fastapi import APIRouter, Security
 from deezer.core.auth import get_api_key
 
 router = APIRouter(tags=["V1 API"], dependencies=[Security(get_api_key)])
+# The security dependency only works on HTTP routes, so WebSocket routes authenticate themselves
+websocket_router = APIRouter(tags=["V1 API"])
 
 from deezer.routers.v1.endpoints import *
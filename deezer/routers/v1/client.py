@@ -1,20 +1,44 @@
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
 import httpx
 from fastapi import HTTPException
 
-from deezer.routers.v1.blowfish import decrypt_chunk, generate_blowfish_key
+from deezer.core.blowfish import (
+    CHUNK_SIZE,
+    STRIPE_SIZE,
+    decrypt_stripes,
+    generate_blowfish_key,
+)
+from deezer.core.config import decrypt_batch_stripes
+from deezer.core.http import HTTPPools, pools
+from deezer.core.timing import span
+from deezer.core.workers import workers
+
+# The only gateway error that means the data doesn't exist, anything else means the request itself failed
+NOT_FOUND_ERRORS = {"DATA_ERROR"}
+# Gateway errors that mean the session or its token is no longer valid
+SESSION_ERRORS = {"VALID_TOKEN_REQUIRED", "NEED_USER_AUTH_REQUIRED", "GATEWAY_ERROR"}
+# What api.deezer.com answers with when there's no track for an isrc
+NOT_FOUND_CODE = 800
 
 
 class DeezerClient:
-    def __init__(self) -> None:
-        self.session = httpx.AsyncClient()
+    def __init__(
+        self,
+        http: HTTPPools = pools,
+        renew: Optional[Callable[["DeezerClient"], Awaitable["DeezerClient"]]] = None,
+    ) -> None:
+        self.http = http
+        # Called with this client when Deezer rejects its session, returns one to retry with
+        self.renew = renew
         self.session_id = ""
         self.user_token = ""
         self.user_license_token = ""
         self.api_token = ""
 
-    async def api_request(self, method: str, data: Optional[dict] = {}) -> dict:
+    async def api_request(
+        self, method: str, data: Optional[dict] = {}, retry: bool = True
+    ) -> dict:
         if self.session_id:
             cookies = {"sid": self.session_id}
         else:
@@ -26,28 +50,43 @@ class DeezerClient:
             "api_version": "1.0",
             "api_token": self.api_token,
         }
-        r = await self.session.post(
-            f"https://www.deezer.com/ajax/gw-light.php?",
-            params=params,
-            json=data,
-            cookies=cookies,
-        )
+        with span("gateway"):
+            r = await self.http.gateway.post(
+                f"https://www.deezer.com/ajax/gw-light.php?",
+                params=params,
+                json=data,
+                cookies=cookies,
+            )
         if r.status_code != 200:
             raise HTTPException(
                 status_code=500, detail="Had an error while making an API request."
             )
-        return r.json()
+
+        j = r.json()
+        if j.get("error") and set(j["error"]) & SESSION_ERRORS and retry and self.renew:
+            client = await self.renew(self)
+            return await client.api_request(method, data, retry=False)
+
+        # Bad tokens come back as errors with empty results, they must not look like missing data
+        if j.get("error") and not set(j["error"]) <= NOT_FOUND_ERRORS:
+            raise HTTPException(
+                status_code=500, detail="Had an error while making an API request."
+            )
+        return j
 
     async def setup_client(self) -> None:
-        ping_request = await self.api_request("deezer.ping")
-        self.session_id = ping_request["results"]["SESSION"]
+        with span("setup_client"):
+            ping_request = await self.api_request("deezer.ping", retry=False)
+            self.session_id = ping_request["results"]["SESSION"]
 
-        user_data_request = await self.api_request("deezer.getUserData")
-        self.user_token = user_data_request["results"]["USER_TOKEN"]
-        self.user_license_token = user_data_request["results"]["USER"]["OPTIONS"][
-            "license_token"
-        ]
-        self.api_token = user_data_request["results"]["checkForm"]
+            user_data_request = await self.api_request(
+                "deezer.getUserData", retry=False
+            )
+            self.user_token = user_data_request["results"]["USER_TOKEN"]
+            self.user_license_token = user_data_request["results"]["USER"]["OPTIONS"][
+                "license_token"
+            ]
+            self.api_token = user_data_request["results"]["checkForm"]
 
     async def search(self, query: str) -> dict:
         data = {"query": query, "start": 0, "nb": 10, "top_tracks": True}
@@ -77,7 +116,8 @@ class DeezerClient:
 
     async def isrc_to_id(self, isrc: str) -> int:
         url = f"https://api.deezer.com/2.0/track/isrc:{isrc}"
-        r = await self.session.get(url)
+        with span("isrc_to_id"):
+            r = await self.http.api.get(url)
         if r.status_code != 200:
             raise HTTPException(
                 status_code=500, detail="Had an error while making an API request."
@@ -85,8 +125,12 @@ class DeezerClient:
         j = r.json()
         if "id" in j.keys():
             return j["id"]
+        if j.get("error", {}).get("code") != NOT_FOUND_CODE:
+            raise HTTPException(
+                status_code=500, detail="Had an error while making an API request."
+            )
 
-    async def download_track(self, track_info: dict) -> bytes:
+    async def get_url(self, track_info: dict) -> str:
         data = {
             "license_token": self.user_license_token,
             "media": [
@@ -97,21 +141,108 @@ class DeezerClient:
             ],
             "track_tokens": [track_info["TRACK_TOKEN"]],
         }
-        resp = await self.session.post("https://media.deezer.com/v1/get_url", json=data)
+        with span("get_url"):
+            resp = await self.http.media.post(
+                "https://media.deezer.com/v1/get_url", json=data
+            )
         if resp.status_code != 200:
             raise HTTPException(
                 status_code=500, detail="Had an error while making an API request."
             )
         json = resp.json()
 
-        url = json["data"][0]["media"][0]["sources"][0]["url"]
-
-        blowfish_key = generate_blowfish_key(track_info["SNG_ID"])
-        async with self.session.stream("GET", url) as r:
-            iterations = 0
-            async for data in r.aiter_bytes(chunk_size=2048):
-                if iterations % 3 == 0 and len(data) == 2048:
-                    data = decrypt_chunk(data, blowfish_key)
-                yield data
-                iterations += 1
-                continue
+        try:
+            return json["data"][0]["media"][0]["sources"][0]["url"]
+        except (KeyError, IndexError, TypeError):
+            # Tracks that can't be played, such as region restricted ones, come back with errors instead of media
+            raise HTTPException(
+                status_code=500, detail="Had an error while making an API request."
+            )
+
+    async def open_track(
+        self, track_info: dict, start: int = 0, end: Optional[int] = None
+    ) -> "TrackStream":
+        """
+        Requests the track from the CDN and checks the response, so upstream errors are raised before anything has been streamed. `start` and `end` (inclusive) select a byte range of it, which is requested from the CDN widened to whole stripes so only the stripes covering the range are downloaded and decrypted.
+        """
+        url = await self.get_url(track_info)
+
+        headers = {}
+        aligned_start = start - start % STRIPE_SIZE
+        if aligned_start or end is not None:
+            aligned_end = (
+                "" if end is None else (end // CHUNK_SIZE + 1) * CHUNK_SIZE - 1
+            )
+            headers["Range"] = f"bytes={aligned_start}-{aligned_end}"
+
+        with span("cdn"):
+            r = await self.http.cdn.send(
+                self.http.cdn.build_request("GET", url, headers=headers), stream=True
+            )
+        if r.status_code not in (200, 206):
+            await r.aclose()
+            raise HTTPException(
+                status_code=500, detail="Had an error while making an API request."
+            )
+
+        # The CDN sends the whole file if it ignores the range
+        skip = start - aligned_start if r.status_code == 206 else start
+        remaining = None if end is None else end - start + 1
+        return TrackStream(
+            r, generate_blowfish_key(track_info["SNG_ID"]), skip, remaining
+        )
+
+
+class TrackStream:
+    """
+    An opened CDN response for a track, decrypted as it's read. `size` is the whole file's size according to the CDN, None if it didn't say.
+    """
+
+    def __init__(
+        self,
+        response: httpx.Response,
+        blowfish_key: bytes,
+        skip: int,
+        remaining: Optional[int],
+    ) -> None:
+        self.response = response
+        self.blowfish_key = blowfish_key
+        self.skip = skip
+        self.remaining = remaining
+
+        if response.status_code == 206:
+            size = response.headers.get("Content-Range", "").rpartition("/")[2]
+        else:
+            size = response.headers.get("Content-Length", "")
+        self.size = int(size) if size.isdigit() else None
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        skip, remaining = self.skip, self.remaining
+        try:
+            with span("cdn"):
+                # Batches are whole stripes, so each one starts with an encrypted chunk
+                async for data in self.response.aiter_bytes(
+                    chunk_size=STRIPE_SIZE * decrypt_batch_stripes
+                ):
+                    with span("decrypt"):
+                        data = await workers.run(
+                            decrypt_stripes, data, self.blowfish_key
+                        )
+
+                    if skip >= len(data):
+                        skip -= len(data)
+                        continue
+                    data = data[skip:]
+                    skip = 0
+
+                    if remaining is not None:
+                        data = data[:remaining]
+                        remaining -= len(data)
+                    yield data
+                    if remaining == 0:
+                        break
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.response.aclose()
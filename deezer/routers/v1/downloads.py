@@ -0,0 +1,122 @@
+import asyncio
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+
+
+class InProgressDownload:
+    """
+    A single upstream download that any number of requests can read from.
+
+    Readers first replay the chunks that have already been buffered, then follow new chunks as they arrive.
+    Once the download has finished, `on_complete` is called once with the whole file if any reader set `keep`.
+    """
+
+    def __init__(
+        self, on_complete: Optional[Callable[[bytes], Awaitable[None]]] = None
+    ) -> None:
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.updated = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.on_complete = on_complete
+        self.keep = False
+        self.started = False
+        self.size: Optional[int] = None
+
+    async def feed(
+        self,
+        open_stream: Callable[[], Awaitable[AsyncIterable[bytes]]],
+        release: Callable[[], None],
+    ) -> None:
+        """
+        Opens the upstream stream and buffers it, then calls `release` to take the download out of the registry.
+        """
+        try:
+            stream = await open_stream()
+            async with self.updated:
+                self.started = True
+                self.size = getattr(stream, "size", None)
+                self.updated.notify_all()
+
+            async for chunk in stream:
+                async with self.updated:
+                    self.chunks.append(chunk)
+                    self.updated.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self.updated:
+                self.done = True
+                self.updated.notify_all()
+
+        # Nothing is awaited between deciding and releasing, so no request can join after the decision
+        if not (self.keep and self.on_complete and not self.error):
+            release()
+            return
+
+        # A kept download stays joinable until it's cached, so no request starts a second one in between
+        try:
+            await self.on_complete(b"".join(self.chunks))
+        finally:
+            release()
+
+    async def wait_started(self) -> Optional[int]:
+        """
+        Waits until the upstream stream has been opened and returns its size, or raises the error that stopped it from opening.
+        """
+        async with self.updated:
+            await self.updated.wait_for(lambda: self.started or self.done)
+        if not self.started:
+            raise self.error
+        return self.size
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        position = 0
+        while True:
+            async with self.updated:
+                await self.updated.wait_for(
+                    lambda: self.done or position < len(self.chunks)
+                )
+                chunks = self.chunks[position:]
+                done = self.done
+
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+
+            if done and position == len(self.chunks):
+                if self.error:
+                    raise self.error
+                return
+
+
+in_progress: Dict[int, InProgressDownload] = {}
+
+
+def shared_download(
+    track_id: int,
+    open_stream: Callable[[], Awaitable[AsyncIterable[bytes]]],
+    on_complete: Optional[Callable[[bytes], Awaitable[None]]] = None,
+) -> InProgressDownload:
+    """
+    Returns the running download for a track, calling `open_stream` to begin one if there isn't one yet.
+
+    The upstream stream runs in its own task, so it keeps going if the request that started it disconnects.
+    """
+    download = in_progress.get(track_id)
+    if download:
+        return download
+
+    download = in_progress[track_id] = InProgressDownload(on_complete)
+    download.task = asyncio.create_task(
+        download.feed(open_stream, lambda: in_progress.pop(track_id, None))
+    )
+    return download
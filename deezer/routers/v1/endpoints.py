@@ -1,21 +1,24 @@
-import base64
-import contextlib
+import asyncio
 import json
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional, Tuple
 
-from fastapi import HTTPException, Request
-from fastapi.responses import Response
+from fastapi import HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import Response, StreamingResponse
 
+from deezer.core.auth import get_api_key
+from deezer.core.cache import audio, metadata, stores
+from deezer.core.compression import compress, decompress, encoded_response
 from deezer.core.config import *
+from deezer.core.http import pools
 from deezer.core.models import (
     InvalidAuthorizationHeaderError,
     NoAuthorizationHeaderError,
     ValidationError,
 )
-from deezer.core.redis import redis
-from deezer.routers.v1 import router
-from deezer.routers.v1.client import DeezerClient
+from deezer.routers.v1 import router, websocket_router
+from deezer.routers.v1.downloads import shared_download
 from deezer.routers.v1.models import *
+from deezer.routers.v1.sessions import sessions
 from deezer.routers.v1.utils import *
 
 
@@ -30,27 +33,8 @@ from deezer.routers.v1.utils import *
         500: {"model": DeezerError},
     },
 )
-async def search(query: str) -> Union[SearchResults, Response]:
-    redis_result = await redis.get(
-        json.dumps({"endpoint": "/v1/search", "query": query})
-    )
-    if redis_result:
-        await redis.expire(
-            json.dumps({"endpoint": "/v1/search", "query": query}), search_ttl
-        )
-        return Response(content=redis_result.decode("utf8"), status_code=200, media_type="application/json")
-
-    client = DeezerClient()
-    await client.setup_client()
-
-    response = await client.search(query)
-    await client.session.aclose()
-
-    r = search_parser(response)
-    await redis.set(
-        json.dumps({"endpoint": "/v1/search", "query": query}), r.json(), ex=search_ttl
-    )
-    return r
+async def search(request: Request, query: str) -> Union[SearchResults, Response]:
+    return encoded_response(request, await cached_search(query))
 
 
 @router.get(
@@ -65,31 +49,80 @@ async def search(query: str) -> Union[SearchResults, Response]:
     },
 )
 async def search_suggestions(
+    request: Request,
     query: str,
 ) -> Union[SearchSuggestionsResponse, Response]:
-    redis_result = await redis.get(
-        json.dumps({"endpoint": "/v1/search/suggestions", "query": query})
-    )
-    if redis_result:
-        await redis.expire(
-            json.dumps({"endpoint": "/v1/search/suggestions", "query": query}),
-            search_suggestions_ttl,
+    return encoded_response(request, await cached_search_suggestions(query))
+
+
+@websocket_router.websocket("/search/typeahead")
+async def search_typeahead(websocket: WebSocket) -> None:
+    """
+    Search as you type over one connection. Send a JSON message such as `{"query": "taylor sw", "type": "suggestions"}` on every keystroke, where `type` is `search` (the default) or `suggestions`.
+
+    Queries are debounced by `DEEZER_TYPEAHEAD_DEBOUNCE` milliseconds, and a new query cancels the previous one if it hasn't been answered yet. Answers look like `{"type": "search", "query": "taylor sw", "results": {...}}`, where `results` is what the matching HTTP endpoint returns, or `{"type": ..., "query": ..., "error": "..."}`.
+
+    The API key goes in the `Authorization` header, or in the `authorization` query parameter for clients that can't set headers.
+    """
+    try:
+        await get_api_key(
+            websocket.headers.get("Authorization")
+            or websocket.query_params.get("authorization")
         )
-        return Response(content=redis_result.decode("utf8"), status_code=200, media_type="application/json")
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
 
-    client = DeezerClient()
-    await client.setup_client()
+    await websocket.accept()
 
-    response = await client.search_suggesions(query)
-    await client.session.aclose()
+    async def answer(type: str, query: str) -> None:
+        await asyncio.sleep(typeahead_debounce / 1000)
+        try:
+            if type == "suggestions":
+                results = await cached_search_suggestions(query)
+            else:
+                results = await cached_search(query)
+        except HTTPException as e:
+            error = e.detail
+        except Exception:
+            # Nothing awaits this task, so anything it doesn't catch would be lost along with the answer
+            error = "Something went wrong. This is an issue on our end and should hopefully be fixed soon."
+        else:
+            error = None
 
-    r = search_suggestion_parser(response)
-    await redis.set(
-        json.dumps({"endpoint": "/v1/search/suggestions", "query": query}),
-        r.json(),
-        ex=search_suggestions_ttl,
-    )
-    return r
+        if error:
+            await websocket.send_text(
+                json.dumps({"type": type, "query": query, "error": error})
+            )
+            return
+
+        # The cached payload is already JSON, so it's spliced in rather than parsed again
+        await websocket.send_text(
+            f'{{"type": {json.dumps(type)}, "query": {json.dumps(query)}, "results": {decompress(results).decode("utf8")}}}'
+        )
+
+    pending: Optional[asyncio.Task] = None
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                query = str(message["query"])
+                type = message.get("type", "search")
+            except (ValueError, KeyError, TypeError):
+                await websocket.send_text(
+                    json.dumps({"error": "Messages must be JSON with a query."})
+                )
+                continue
+
+            if pending:
+                pending.cancel()
+            if query.strip():
+                pending = asyncio.create_task(answer(type, query))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if pending:
+            pending.cancel()
 
 
 @router.get(
@@ -104,139 +137,134 @@ async def search_suggestions(
         500: {"model": DeezerError},
     },
 )
-async def track_info(id: str) -> Union[SearchSuggestionsResponse, Response]:
+async def track_info(
+    request: Request, id: str
+) -> Union[SearchSuggestionsResponse, Response]:
     """
     The `id` path parameter is the track ID. Alternatively, you can prefix an isrc with `isrc:` to get the track info for that isrc.
     Example: `/v1/track/info/isrc:USUM71900001`
     """
-    with contextlib.suppress(Exception):
-        id = int(id)
-        redis_result = await redis.get(
-            json.dumps({"endpoint": "/v1/track/info", "id": id})
-        )
-        if redis_result:
-            return Response(content=redis_result.decode("utf8"), status_code=200, media_type="application/json")
-
-    client = DeezerClient()
-    await client.setup_client()
-
-    try:
-        id = int(id)
-    except:
-        if id.startswith("isrc:"):
-            redis_result = await redis.get(
-                json.dumps({"endpoint": "/v1/isrc-id", "isrc": id[5:]})
-            )
-            if redis_result:
-                id = json.loads(redis_result)["id"]
-            else:
-                id = await client.isrc_to_id(id[5:])
-                if not id:
-                    raise HTTPException(
-                        status_code=404,
-                        detail="The track you specified could not be found.",
-                    )
-        else:
-            raise HTTPException(
-                status_code=404, detail="The track you specified could not be found."
-            )
+    id = await resolve_track_id(id)
 
-    # Now we need to check redis again, because we have the the id
-    redis_result = await redis.get(json.dumps({"endpoint": "/v1/track/info", "id": id}))
+    redis_result = await metadata.get(
+        json.dumps({"endpoint": "/v1/track/info", "id": id})
+    )
     if redis_result:
-        return Response(content=redis_result.decode("utf8"), status_code=200, media_type="application/json")
+        return encoded_response(request, redis_result)
+
+    await raise_if_not_found(
+        json.dumps({"endpoint": "/v1/track/info", "id": id}), "Track not found."
+    )
 
+    client = await sessions.get_client()
     response = await client.get_track_info(id)
-    await client.session.aclose()
 
     if not response:
-        raise HTTPException(status_code=404, detail="Track not found.")
+        await cache_not_found(
+            json.dumps({"endpoint": "/v1/track/info", "id": id}), "Track not found."
+        )
 
-    r = track_info_mapper(response)
-    await redis.set(json.dumps({"endpoint": "/v1/track/info", "id": id}), r.json())
-    return r
+    r = compress(track_info_mapper(response).json().encode("utf8"))
+    await metadata.set(json.dumps({"endpoint": "/v1/track/info", "id": id}), r)
+    return encoded_response(request, r)
 
 
 @router.get(
     "/track/lyrics/{id}",
     summary="Get track lyrics.",
-    response_model=TrackLyricsResponse,
+    response_model=Union[TrackLyricsResponse, CompactTrackLyricsResponse],
     responses={
         401: {"model": NoAuthorizationHeaderError},
         403: {"model": InvalidAuthorizationHeaderError},
-        404: {"model": TrackNotFoundError},
+        404: {"model": Union[TrackNotFoundError, LyricsNotFoundError]},
         422: {"model": ValidationError},
         500: {"model": DeezerError},
     },
 )
-async def track_lyrics(id: str) -> TrackLyricsResponse:
+async def track_lyrics(
+    request: Request, id: str, compact: Optional[bool] = False
+) -> Union[TrackLyricsResponse, Response]:
     """
     The `id` path parameter is the track ID. Alternatively, you can prefix an isrc with `isrc:` to get the track info for that isrc.
     Example: `/v1/track/info/isrc:USUM71900001`
+
+    With `compact`, the synced lines are returned as parallel `lines`, `starts` and `durations` arrays instead of one object per line.
     """
-    with contextlib.suppress(Exception):
-        id = int(id)
-        redis_result = await redis.get(
-            json.dumps({"endpoint": "/v1/track/lyrics", "id": id})
-        )
+    id = await resolve_track_id(id)
+
+    # The expanded form is cached as well once it's asked for, so hits are passed through as is
+    expanded_key = json.dumps({"endpoint": "/v1/track/lyrics", "id": id})
+    if not compact:
+        redis_result = await metadata.get(expanded_key)
         if redis_result:
-            await redis.expire(
-                json.dumps({"endpoint": "/v1/track/lyrics", "id": id}), track_lyrics_ttl
-            )
-            return Response(content=redis_result.decode("utf8"), status_code=200, media_type="application/json")
+            await metadata.expire(expanded_key, track_lyrics_ttl)
+            return encoded_response(request, redis_result)
+
+    lyrics = (await get_track_lyrics([id]))[0]
+    if not lyrics:
+        raise HTTPException(
+            status_code=404, detail="The track you specified has no lyrics."
+        )
 
-    client = DeezerClient()
-    await client.setup_client()
+    if compact:
+        return encoded_response(request, lyrics)
 
-    try:
-        id = int(id)
-    except:
-        if id.startswith("isrc:"):
-            redis_result = await redis.get(
-                json.dumps({"endpoint": "/v1/isrc-id", "isrc": id[5:]})
-            )
-            if redis_result:
-                id = json.loads(redis_result)["id"]
-            else:
-                id = await client.isrc_to_id(id[5:])
-                if not id:
-                    raise HTTPException(
-                        status_code=404,
-                        detail="The track you specified could not be found.",
-                    )
-        else:
-            raise HTTPException(
-                status_code=404, detail="The track you specified could not be found."
-            )
+    r = expand_lyrics(CompactTrackLyricsResponse(**json.loads(decompress(lyrics))))
+    r = compress(r.json().encode("utf8"))
+    await metadata.set(expanded_key, r, ex=track_lyrics_ttl)
+    return encoded_response(request, r)
 
-    redis_result = await redis.get(
-        json.dumps({"endpoint": "/v1/track/lyrics", "id": id})
-    )
-    if redis_result:
-        await redis.expire(
-            json.dumps({"endpoint": "/v1/track/lyrics", "id": id}), track_lyrics_ttl
-        )
-        return Response(content=redis_result.decode("utf8"), status_code=200, media_type="application/json")
 
-    response = await client.get_lyrics(id)
-    await client.session.aclose()
+@router.post(
+    "/track/lyrics",
+    summary="Get the lyrics of several tracks.",
+    response_model=BulkLyricsResponse,
+    responses={
+        401: {"model": NoAuthorizationHeaderError},
+        403: {"model": InvalidAuthorizationHeaderError},
+        422: {"model": ValidationError},
+        500: {"model": DeezerError},
+    },
+)
+async def bulk_track_lyrics(
+    request: Request, body: BulkLyricsRequest
+) -> Union[BulkLyricsResponse, Response]:
+    """
+    Takes up to `DEEZER_BULK_LYRICS_LIMIT` track IDs or isrcs prefixed with `isrc:`, and returns their lyrics in the same order.
+    Tracks that can't be found or have no lyrics get an `error` instead.
+
+    With `compact`, the synced lines are returned as parallel `lines`, `starts` and `durations` arrays instead of one object per line.
+    """
+    if len(body.ids) > bulk_lyrics_limit:
+        raise HTTPException(
+            status_code=422,
+            detail=f"You can get the lyrics of at most {bulk_lyrics_limit} tracks at once.",
+        )
 
-    r = TrackLyricsResponse(
-        text=response["LYRICS_TEXT"],
-        lines=[
-            LyricLine(
-                text=line["line"], start=line["milliseconds"], duration=line["duration"]
+    track_ids = await resolve_track_ids(body.ids)
+    found = [track_id for track_id in track_ids if track_id is not None]
+    lyrics = dict(zip(found, await get_track_lyrics(found)))
+
+    results = []
+    for id, track_id in zip(body.ids, track_ids):
+        if track_id is None:
+            results.append(
+                BulkLyricsResult(
+                    id=id, error="The track you specified could not be found."
+                )
+            )
+        elif not lyrics[track_id]:
+            results.append(
+                BulkLyricsResult(id=id, error="The track you specified has no lyrics.")
+            )
+        else:
+            r = CompactTrackLyricsResponse(**json.loads(decompress(lyrics[track_id])))
+            results.append(
+                BulkLyricsResult(id=id, lyrics=r if body.compact else expand_lyrics(r))
             )
-            for line in response["LYRICS_SYNC_JSON"]
-            if "LYRICS_SYNC_JSON" in response.keys() and line["line"]
-        ],
-    )
-    await redis.set(
-        json.dumps({"endpoint": "/v1/track/lyrics", "id": id}),
-        r.json(),
-        ex=track_lyrics_ttl,
-    )
-    return r
+
+    r = BulkLyricsResponse(results=results)
+    return encoded_response(request, compress(r.json().encode("utf8")))
 
 
 @router.get(
@@ -263,137 +291,200 @@ async def track_download(
 
     The `image` parameter is used to determine whether or not to inject image ID3 tag into the track. This makes the file size slightly larger and makes the request take longer to complete. It is enabled by default.
     """
-    start, end = 0, None
+    first, last, suffix = 0, None, None
     range_header = request.headers.get("Range")
     if range_header:
         try:
-            range = range_header.split("bytes")[1].strip("=")
-
-            start, end = range.split("-")
-            if not end:
-                end = None
-            if not start:
-                start = 0
-
-            start = int(start)
-            if end:
-                end = int(end)
-        except:
-            pass  # We already set the range, so it'll fall back to the default range
-
-    def process_range(data: bytes):
-        if not end:
-            return data[start:]
+            range_start, range_end = range_header.split("bytes=")[1].split("-")
+            if range_start:
+                parsed = int(range_start), int(range_end) if range_end else None, None
+            else:
+                parsed = 0, None, int(range_end)  # bytes=-500 is the last 500 bytes
+        except (IndexError, ValueError):
+            range_header = None  # Serve the whole file if the range can't be parsed
         else:
-            return data[start:end]
-
-    with contextlib.suppress(Exception):
-        id = int(id)
-        redis_result = await redis.get(
-            json.dumps(
-                {"endpoint": "/v1/track/download", "track_id": id, "image": image}
-            )
-        )
-        if redis_result:
-            redis_result = json.loads(redis_result)
-            file_name = redis_result["file_name"]
-            file = base64.b64decode(redis_result["file"])
-            duration = redis_result["duration"]
-            await redis.expire(
-                json.dumps(
-                    {"endpoint": "/v1/track/download", "track_id": id, "image": image}
-                ),
-                duration * 3,
-            )
+            first, last, suffix = parsed
+
+    def byte_range(total: int) -> Optional[Tuple[int, int]]:
+        """
+        The inclusive range to send out of `total` bytes, None if it can't be satisfied.
+        """
+        if suffix is not None:
+            return (max(total - suffix, 0), total - 1) if suffix > 0 else None
+        if first >= total or (last is not None and last < first):
+            return None
+        return first, total - 1 if last is None else min(last, total - 1)
+
+    def audio_response(
+        total: int, stream: Callable[[int, int], AsyncIterator[bytes]]
+    ) -> Response:
+        if byte_range(total) is None:
             return Response(
-                content=process_range(file),
-                media_type="audio/mpeg",
-                headers={
-                    "Content-Disposition": f"attachment; filename={file_name}".encode(
-                        "utf8"
-                    ).decode("latin1"),
-                },
+                status_code=416, headers={"Content-Range": f"bytes */{total}"}
             )
 
-    client = DeezerClient()
-    await client.setup_client()
+        start, end = byte_range(total)
+        headers = {
+            "Content-Disposition": f"attachment; filename={file_name}".encode(
+                "utf8"
+            ).decode("latin1"),
+            "Content-Length": str(end - start + 1),
+        }
+        if range_header:
+            headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        return StreamingResponse(
+            stream(start, end),
+            status_code=206 if range_header else 200,
+            media_type="audio/mpeg",
+            headers=headers,
+        )
 
-    try:
-        id = int(id)
-    except:
-        if id.startswith("isrc:"):
-            redis_result = await redis.get(
-                json.dumps({"endpoint": "/v1/isrc-id", "isrc": id[5:]})
-            )
-            if redis_result:
-                id = json.loads(redis_result)["id"]
-            else:
-                id = await client.isrc_to_id(id[5:])
-                if not id:
-                    raise HTTPException(
-                        status_code=404,
-                        detail="The track you specified could not be found.",
-                    )
-        else:
-            raise HTTPException(
-                status_code=404, detail="The track you specified could not be found."
+    id = await resolve_track_id(id)
+
+    # The audio is cached once per track and the ID3 header once per variant, a response is the two put together
+    audio_key = json.dumps({"endpoint": "/v1/track/download", "track_id": id})
+    id3_key = json.dumps({"endpoint": "/v1/track/id3", "track_id": id, "image": image})
+    body, id3 = await audio.get_many([audio_key, id3_key])
+
+    if not (body and id3):
+        await raise_if_not_found(
+            json.dumps({"endpoint": "/v1/track/info", "id": id}), "Track not found."
+        )
+
+        track_info = await get_track_data(id)
+        if not track_info:
+            await cache_not_found(
+                json.dumps({"endpoint": "/v1/track/info", "id": id}), "Track not found."
             )
 
-    redis_result = await redis.get(
-        json.dumps({"endpoint": "/v1/track/download", "track_id": id, "image": image})
-    )
-    if redis_result:
-        redis_result = json.loads(redis_result)
-        file_name = redis_result["file_name"]
-        file = base64.b64decode(redis_result["file"])
-        duration = redis_result["duration"]
-        await redis.expire(
-            json.dumps(
-                {"endpoint": "/v1/track/download", "track_id": id, "image": image}
-            ),
-            duration * 3,
+        client = await sessions.get_client()
+
+    # The header can carry a 1000x1000 cover, so it's kept in the audio namespace under the same admission as the body
+    if id3:
+        details, id3_header = id3.split(b"\n", 1)
+        details = json.loads(details)
+        file_name = details["file_name"]
+        duration = details["duration"]
+    else:
+        file_name = f"{track_info['SNG_TITLE']} - {track_info['ART_NAME']}.mp3"
+        duration = int(track_info["DURATION"])
+        id3_header = await build_id3(client, track_info, image)
+
+    async def cache_id3() -> None:
+        details = json.dumps({"file_name": file_name, "duration": duration})
+        await audio.set(
+            id3_key, details.encode("utf8") + b"\n" + id3_header, ex=duration * 3
         )
 
-        return Response(
-            content=process_range(file),
-            media_type="audio/mpeg",
-            headers={
-                "Content-Disposition": f"attachment; filename={file_name}".encode(
-                    "utf8"
-                ).decode("latin1"),
-            },
+    if body:
+        if id3:
+            await audio.expire_many([audio_key, id3_key], duration * 3)
+        else:
+            await audio.expire(audio_key, duration * 3)
+            await cache_id3()
+        return audio_response(
+            len(id3_header) + len(body),
+            lambda start, end: slice_parts([id3_header, body], start, end),
         )
 
-    track_info = await client.get_track_info(id)
-    if not track_info:
-        raise HTTPException(status_code=404, detail="Track not found.")
+    # Seeking into a track that isn't cached, so only fetch the stripes the range covers
+    file_size = int(track_info.get("FILESIZE_MP3_128") or 0)
+    total = len(id3_header) + file_size
+    requested = byte_range(total)
+    if range_header and file_size and (requested is None or requested[0] > 0):
+        stream = None
+        if requested and requested[1] >= len(id3_header):
+            # Opened before responding, so upstream errors still get an error status
+            stream = await client.open_track(
+                track_info,
+                max(requested[0] - len(id3_header), 0),
+                requested[1] - len(id3_header),
+            )
 
-    audio_streamer = client.download_track(track_info)
-    audio_data = b"".join([a async for a in audio_streamer])
+        if stream is None or stream.size == file_size:
+
+            async def stream_range(start: int, end: int) -> AsyncIterator[bytes]:
+                try:
+                    if start < len(id3_header):
+                        yield id3_header[start : end + 1]
+                    if stream:
+                        async for chunk in stream:
+                            yield chunk
+                finally:
+                    if stream:
+                        await stream.aclose()
+
+            return audio_response(total, stream_range)
+
+        # FILESIZE_MP3_128 doesn't match the CDN, so the range is cut from the whole file instead
+        await stream.aclose()
+
+    seen = await audio_sketch.increment(str(id))
+
+    async def cache_body(body: bytes) -> None:
+        if len(body) <= audio_max_entry_size:
+            await audio.set(audio_key, body, ex=duration * 3)
+
+    download = shared_download(id, lambda: client.open_track(track_info), cache_body)
+    # Most tracks are only played once, so only keep the ones that are requested again
+    if seen >= audio_admission_threshold:
+        download.keep = True
+
+    # Waiting for the CDN before responding lets upstream errors go through the exception handlers
+    size = await download.wait_started()
+    if seen >= audio_admission_threshold and not id3:
+        if (size or file_size) <= audio_max_entry_size:
+            await cache_id3()
+
+    # Without a length from the CDN there's no Content-Length to promise until the whole file is in
+    if not size:
+        body = b"".join([a async for a in download])
+        return audio_response(
+            len(id3_header) + len(body),
+            lambda start, end: slice_parts([id3_header, body], start, end),
+        )
 
-    audio_data = await inject_id3(client, track_info, audio_data, image)
+    async def stream_download(start: int, end: int) -> AsyncIterator[bytes]:
+        async def chunks():
+            yield id3_header
+            async for chunk in download:
+                yield chunk
 
-    await client.session.aclose()
+        async for chunk in slice_stream(chunks(), start, end):
+            yield chunk
 
-    file_name = f"{track_info['SNG_TITLE']} - {track_info['ART_NAME']}.mp3"
-    data = {
-        "file_name": file_name,
-        "duration": int(track_info["DURATION"]),
-        "file": base64.b64encode(audio_data).decode("utf-8"),
-    }
-    await redis.set(
-        json.dumps({"endpoint": "/v1/track/download", "track_id": id, "image": image}),
-        json.dumps(data),
-        ex=int(track_info["DURATION"]) * 3,
-    )
+    return audio_response(len(id3_header) + size, stream_download)
 
-    file_name = track_info["SNG_TITLE"] + " - " + track_info["ART_NAME"] + ".mp3"
-    return Response(
-        content=process_range(audio_data),
-        media_type="audio/mpeg",
-        headers={
-            "Content-Disposition": f"attachment; filename={file_name}".encode(
-                "utf8"
-            ).decode("latin1"),
-        },
+
+@router.get(
+    "/stats/cache",
+    summary="Get cache usage per namespace.",
+    response_model=CacheUsageResponse,
+    responses={
+        401: {"model": NoAuthorizationHeaderError},
+        403: {"model": InvalidAuthorizationHeaderError},
+    },
+)
+async def cache_stats() -> CacheUsageResponse:
+    """
+    Metadata (search, suggestions, track info and lyrics) and audio are cached in separate namespaces, each with its own byte budget. A budget of `0` means the namespace is never evicted by the proxy.
+    """
+    return CacheUsageResponse(
+        namespaces=[CacheNamespaceUsage(**await store.usage()) for store in stores]
     )
+
+
+@router.get(
+    "/stats/pools",
+    summary="Get connection pool usage per upstream.",
+    response_model=PoolUsageResponse,
+    responses={
+        401: {"model": NoAuthorizationHeaderError},
+        403: {"model": InvalidAuthorizationHeaderError},
+    },
+)
+async def pool_stats() -> PoolUsageResponse:
+    """
+    Each upstream (`gateway`, `api`, `media`, `cdn` and `images`) has its own connection pool, which is only listed once it has been used.
+    """
+    return PoolUsageResponse(pools=[PoolUsage(**pool) for pool in pools.usage()])
@@ -15,6 +15,10 @@ class TrackNotFoundError(BaseModel):
     error: str = Field(..., example="The track you specified could not be found.")
 
 
+class LyricsNotFoundError(BaseModel):
+    error: str = Field(..., example="The track you specified has no lyrics.")
+
+
 class Artwork(BaseModel):
     url: str = Field(
         ...,
@@ -39,6 +43,31 @@ class TrackLyricsResponse(BaseModel):
     lines: List[LyricLine]
 
 
+class CompactTrackLyricsResponse(BaseModel):
+    text: str = Field(..., example="I'm a little teapot, short and stout")
+    lines: List[str] = Field(..., example=["I'm not a human being"])
+    starts: List[int] = Field(..., example=[0])
+    durations: List[int] = Field(..., example=[0])
+
+
+# Models for the POST /v1/track/lyrics endpoint
+
+
+class BulkLyricsRequest(BaseModel):
+    ids: List[str] = Field(..., example=["1053765342", "isrc:USUM71900001"])
+    compact: bool = Field(False, example=True)
+
+
+class BulkLyricsResult(BaseModel):
+    id: str = Field(..., example="isrc:USUM71900001")
+    lyrics: Optional[Union[TrackLyricsResponse, CompactTrackLyricsResponse]] = None
+    error: Optional[str] = Field(None, example="The track you specified has no lyrics.")
+
+
+class BulkLyricsResponse(BaseModel):
+    results: List[BulkLyricsResult]
+
+
 # Models for the /v1/track/info/:id endpoint
 
 
@@ -142,3 +171,36 @@ class SearchResults(BaseModel):
     tracks: List[TrackSearchResult]
     playlists: List[PlaylistSearchResult]
     lyrics: List[TrackSearchResult]
+
+
+# Models for the /v1/stats/cache endpoint
+
+
+class CacheNamespaceUsage(BaseModel):
+    namespace: str = Field(..., example="audio")
+    budget: int = Field(..., example=1073741824)
+    bytes: int = Field(..., example=52428800)
+    entries: int = Field(..., example=12)
+    evictions: int = Field(..., example=3)
+    hits: int = Field(..., example=120)
+    misses: int = Field(..., example=40)
+
+
+class CacheUsageResponse(BaseModel):
+    namespaces: List[CacheNamespaceUsage]
+
+
+# Models for the /v1/stats/pools endpoint
+
+
+class PoolUsage(BaseModel):
+    name: str = Field(..., example="cdn")
+    max_connections: int = Field(..., example=100)
+    connections: int = Field(..., example=4)
+    active: int = Field(..., example=3)
+    idle: int = Field(..., example=1)
+    http2: int = Field(..., example=0)
+
+
+class PoolUsageResponse(BaseModel):
+    pools: List[PoolUsage]
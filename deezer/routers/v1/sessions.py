@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Optional
+
+from deezer.core.config import session_ttl
+from deezer.routers.v1.client import DeezerClient
+
+
+class DeezerSessions:
+    """
+    Keeps one authenticated Deezer session that every request shares, so requests don't each pay for `setup_client`.
+
+    The session is re-authenticated once it is older than `DEEZER_SESSION_TTL`, or as soon as Deezer rejects it. Requests that are still using the old session keep working, as the connection pools are shared between them.
+    """
+
+    def __init__(self) -> None:
+        self.client: Optional[DeezerClient] = None
+        self.authenticated_at = 0.0
+        self.lock: Optional[asyncio.Lock] = None
+
+    def is_fresh(self) -> bool:
+        return (
+            self.client is not None
+            and time.monotonic() - self.authenticated_at < session_ttl
+        )
+
+    async def get_client(self) -> DeezerClient:
+        if self.is_fresh():
+            return self.client
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if not self.is_fresh():
+                client = DeezerClient(renew=self.renew)
+                await client.setup_client()
+                self.client = client
+                self.authenticated_at = time.monotonic()
+
+        return self.client
+
+    async def renew(self, client: DeezerClient) -> DeezerClient:
+        """
+        Drops `client` if it is still the shared session, and returns a freshly authenticated one.
+        """
+        if self.client is client:
+            self.client = None
+        return await self.get_client()
+
+    def reset(self) -> None:
+        self.client = None
+
+
+sessions = DeezerSessions()
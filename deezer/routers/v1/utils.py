@@ -1,11 +1,51 @@
-from io import BytesIO
-from typing import List
+import asyncio
+import json
+import time
+import unicodedata
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
-from mutagen.id3 import APIC, ID3, TALB, TDRC, TIT2, TPE1, TRCK
+from fastapi import HTTPException
 
+from deezer.core.cache import metadata, negative
+from deezer.core.compression import compress, decompress
+from deezer.core.config import (
+    admission_window,
+    audio_admission_window,
+    negative_ttl,
+    search_admission_threshold,
+    search_suggestions_ttl,
+    search_ttl,
+    sketch_depth,
+    sketch_width,
+    track_data_ttl,
+    track_lyrics_ttl,
+)
+from deezer.core.id3 import build_id3_tag
+from deezer.core.sketch import FrequencySketch
+from deezer.core.timing import span
+from deezer.core.workers import workers
 from deezer.routers.v1.client import DeezerClient
 from deezer.routers.v1.models import *
 from deezer.routers.v1.models import SearchResults
+from deezer.routers.v1.sessions import sessions
+
+search_sketch = FrequencySketch("search", sketch_width, sketch_depth, admission_window)
+suggestions_sketch = FrequencySketch(
+    "suggestions", sketch_width, sketch_depth, admission_window
+)
+audio_sketch = FrequencySketch(
+    "audio", sketch_width, sketch_depth, audio_admission_window
+)
 
 
 def track_info_artist_mapper(data: dict) -> ArtistTrackInfo:
@@ -40,44 +80,59 @@ def track_info_mapper(data: dict) -> TrackInfoResponse:
     )
 
 
-async def inject_id3(
-    client: DeezerClient, track_info: dict, audio_data: bytes, image: bool
-) -> bytes:
-    audio_data = BytesIO(audio_data)
-
-    song_name = track_info["SNG_TITLE"]
-    artist_name = track_info["ART_NAME"]
-    album_name = track_info["ALB_TITLE"]
-    track_number = track_info["TRACK_NUMBER"]  # It's a string
-    release_date = track_info["PHYSICAL_RELEASE_DATE"]  # YYYY-MM-DD format
-
+async def build_id3(client: DeezerClient, track_info: dict, image: bool) -> bytes:
+    """
+    Builds the ID3v2 tag for a track on its own. The CDN serves untagged MP3s, so a tagged file is just this header followed by the audio.
+    """
     album_art_url = (
         "https://cdns-images.dzcdn.net/images/cover/"
         + track_info["ALB_PICTURE"]
         + "/1000x1000-000000-80-0-0.jpg"
     )
 
-    audio = ID3()
-    audio.add(TIT2(encoding=3, text=song_name))
-    audio.add(TPE1(encoding=3, text=artist_name))
-    audio.add(TALB(encoding=3, text=album_name))
-    audio.add(TRCK(encoding=3, text=track_number))
-    audio.add(TDRC(encoding=3, text=release_date))
-
+    album_art = None
     if image:
         try:
-            album_art = (await client.session.get(album_art_url)).read()
-            audio.add(
-                APIC(
-                    encoding=3, mime="image/jpeg", type=3, desc="Cover", data=album_art
-                )
-            )
+            with span("cover"):
+                album_art = (await client.http.images.get(album_art_url)).read()
         except Exception:
             pass  # In the case of an error, we don't want to fail the whole metadata injection because it's not that important
 
-    audio.save(audio_data, v2_version=3)
+    with span("id3"):
+        return await workers.run(build_id3_tag, track_info, album_art)
+
 
-    return audio_data.getvalue()
+async def slice_parts(
+    parts: List[bytes], start: int, end: Optional[int], chunk_size: int = 65536
+) -> AsyncIterator[bytes]:
+    """
+    Streams bytes `start` to `end` (inclusive) of the parts put together, without joining them into one buffer.
+    """
+    offset = 0
+    for part in parts:
+        view = memoryview(part)
+        low = max(start - offset, 0)
+        high = len(part) if end is None else min(end + 1 - offset, len(part))
+        for position in range(low, high, chunk_size):
+            yield bytes(view[position : min(position + chunk_size, high)])
+        offset += len(part)
+
+
+async def slice_stream(
+    chunks: AsyncIterator[bytes], start: int, end: Optional[int]
+) -> AsyncIterator[bytes]:
+    """
+    Streams bytes `start` to `end` (inclusive) of a stream, stopping once `end` has been reached.
+    """
+    offset = 0
+    async for chunk in chunks:
+        low = max(start - offset, 0)
+        high = len(chunk) if end is None else min(end + 1 - offset, len(chunk))
+        if low < high:
+            yield chunk[low:high]
+        offset += len(chunk)
+        if end is not None and offset > end:
+            return
 
 
 def search_suggestion_parser(response: dict) -> SearchSuggestionsResponse:
@@ -198,3 +253,312 @@ def search_parser(response: dict) -> SearchResults:
         playlists=playlists,
         lyrics=lyrics,
     )
+
+
+def normalize_query(query: str) -> str:
+    """
+    Folds the variants of a query that Deezer treats the same (case, whitespace, Unicode compatibility forms) into one cache key.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+async def cached_search(query: str, always_cache: bool = False) -> bytes:
+    """
+    Returns the compressed search results for a query, from the cache if possible.
+
+    Results are only cached once the query has been seen `DEEZER_SEARCH_ADMISSION_THRESHOLD` times in the admission window, so one-off queries don't push out popular ones.
+    """
+    query = normalize_query(query)
+    redis_result = await metadata.get(
+        json.dumps({"endpoint": "/v1/search", "query": query})
+    )
+    if redis_result:
+        await metadata.expire(
+            json.dumps({"endpoint": "/v1/search", "query": query}), search_ttl
+        )
+        return redis_result
+
+    seen = await search_sketch.increment(query)
+
+    client = await sessions.get_client()
+    response = await client.search(query)
+
+    r = compress(search_parser(response).json().encode("utf8"))
+    if always_cache or seen >= search_admission_threshold:
+        await metadata.set(
+            json.dumps({"endpoint": "/v1/search", "query": query}), r, ex=search_ttl
+        )
+        # The tracks in it are only worth caching when the results themselves are
+        run_in_background(cache_search_entities(response))
+    return r
+
+
+async def cached_search_suggestions(query: str) -> bytes:
+    """
+    Returns the compressed search suggestions for a query, from the cache if possible. They are admitted to the cache like search results.
+    """
+    query = normalize_query(query)
+    redis_result = await metadata.get(
+        json.dumps({"endpoint": "/v1/search/suggestions", "query": query})
+    )
+    if redis_result:
+        await metadata.expire(
+            json.dumps({"endpoint": "/v1/search/suggestions", "query": query}),
+            search_suggestions_ttl,
+        )
+        return redis_result
+
+    seen = await suggestions_sketch.increment(query)
+
+    client = await sessions.get_client()
+    response = await client.search_suggesions(query)
+
+    r = compress(search_suggestion_parser(response).json().encode("utf8"))
+    if seen >= search_admission_threshold:
+        await metadata.set(
+            json.dumps({"endpoint": "/v1/search/suggestions", "query": query}),
+            r,
+            ex=search_suggestions_ttl,
+        )
+    return r
+
+
+# Keeps a reference to background tasks so they aren't garbage collected before they finish
+background_tasks: Set[asyncio.Task] = set()
+
+
+def run_in_background(coroutine: Coroutine) -> None:
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+# Fields of a track record that the download endpoint, the CDN request and the ID3 tag need
+TRACK_DATA_FIELDS = (
+    "SNG_ID",
+    "SNG_TITLE",
+    "ART_NAME",
+    "ALB_TITLE",
+    "ALB_PICTURE",
+    "TRACK_NUMBER",
+    "PHYSICAL_RELEASE_DATE",
+    "DURATION",
+    "TRACK_TOKEN",
+    "TRACK_TOKEN_EXPIRE",
+)
+
+
+def track_data_entry(data: dict) -> Optional[Tuple[str, bytes, int]]:
+    """
+    The cache entry for a raw track record, which `get_track_data` serves to the download endpoint. It expires a few minutes before the track token in it does.
+    """
+    if any(data.get(field) in (None, "") for field in TRACK_DATA_FIELDS):
+        return None  # Search results don't always have everything a download needs
+
+    ttl = min(int(data["TRACK_TOKEN_EXPIRE"]) - int(time.time()) - 300, track_data_ttl)
+    if ttl <= 0:
+        return None
+
+    return (
+        json.dumps({"endpoint": "/v1/track/data", "id": int(data["SNG_ID"])}),
+        compress(json.dumps(data).encode("utf8")),
+        ttl,
+    )
+
+
+async def get_track_data(id: int) -> Optional[dict]:
+    """
+    Returns the `song.getData` results for a track, from the cache while its track token is still valid.
+    """
+    redis_result = await metadata.get(
+        json.dumps({"endpoint": "/v1/track/data", "id": id})
+    )
+    if redis_result:
+        return json.loads(decompress(redis_result))
+
+    client = await sessions.get_client()
+    data = await client.get_track_info(id)
+
+    entry = data and track_data_entry(data)
+    if entry:
+        await metadata.set(*entry[:2], ex=entry[2])
+    return data
+
+
+async def cache_search_entities(response: dict) -> None:
+    """
+    Search results already contain the full track records, so they are cached as track info, isrc lookups and track data for downloads, sparing the upstream calls when a client goes on to open or download a result.
+    """
+    tracks = {}
+    for track in response["TRACK"]["data"] + response["LYRICS"]["data"]:
+        tracks[track["SNG_ID"]] = track
+    for top_result in response.get("TOP_RESULT") or []:
+        if top_result.get("__TYPE__") == "track":
+            tracks[top_result["SNG_ID"]] = top_result
+
+    entries = []
+    for track in tracks.values():
+        try:
+            info = track_info_mapper(track)
+        except (KeyError, ValueError):
+            continue  # Not every search result has all the fields track info needs
+
+        entries.append(
+            (
+                json.dumps({"endpoint": "/v1/track/info", "id": info.id}),
+                compress(info.json().encode("utf8")),
+                None,
+            )
+        )
+        entries.append(
+            (
+                json.dumps({"endpoint": "/v1/isrc-id", "isrc": info.isrc}),
+                json.dumps({"id": info.id}).encode("utf8"),
+                None,
+            )
+        )
+        entry = track_data_entry(track)
+        if entry:
+            entries.append(entry)
+
+    await metadata.set_many(entries)
+
+
+async def raise_if_not_found(key: str, detail: str) -> None:
+    """
+    Raises a 404 if an upstream lookup for this key recently came back empty.
+    """
+    if await negative.get(key):
+        raise HTTPException(status_code=404, detail=detail)
+
+
+async def cache_not_found(key: str, detail: str) -> None:
+    """
+    Remembers that an upstream lookup came back empty for `DEEZER_NEGATIVE_TTL` seconds, then raises a 404.
+    """
+    await negative.set(key, b"1", ex=negative_ttl)
+    raise HTTPException(status_code=404, detail=detail)
+
+
+async def cached_many(
+    keys: List[str],
+    args: list,
+    fetch: Callable[[Any], Awaitable[Optional[bytes]]],
+    ex: Optional[int] = None,
+) -> List[Optional[bytes]]:
+    """
+    Looks up many metadata entries in one round trip and fetches the misses concurrently with `fetch(arg)`.
+    Lookups that came back empty, now or in the last `DEEZER_NEGATIVE_TTL` seconds, are None.
+    """
+    unique = dict(zip(keys, args))
+    values = dict(zip(unique, await metadata.get_many(list(unique))))
+
+    hits = [key for key, value in values.items() if value]
+    if hits and ex:
+        await metadata.expire_many(hits, ex)
+
+    misses = [key for key, value in values.items() if not value]
+    not_found = await negative.get_many(misses)
+    misses = [key for key, found in zip(misses, not_found) if not found]
+
+    fetched = await asyncio.gather(*[fetch(unique[key]) for key in misses])
+    values.update(zip(misses, fetched))
+    await metadata.set_many(
+        [(key, value, ex) for key, value in zip(misses, fetched) if value]
+    )
+    await negative.set_many(
+        [(key, b"1", negative_ttl) for key, value in zip(misses, fetched) if not value]
+    )
+    return [values[key] for key in keys]
+
+
+async def resolve_track_ids(ids: List[str]) -> List[Optional[int]]:
+    """
+    Turns track IDs and isrcs prefixed with `isrc:` into track IDs, None for the ones that don't exist.
+    """
+    isrcs = [id[5:] for id in ids if id.startswith("isrc:")]
+
+    async def fetch(isrc: str) -> Optional[bytes]:
+        client = await sessions.get_client()
+        track_id = await client.isrc_to_id(isrc)
+        if track_id:
+            return json.dumps({"id": track_id}).encode("utf8")
+
+    values = await cached_many(
+        [json.dumps({"endpoint": "/v1/isrc-id", "isrc": isrc}) for isrc in isrcs],
+        isrcs,
+        fetch,
+    )
+    resolved = dict(zip(isrcs, values))
+
+    track_ids = []
+    for id in ids:
+        if id.startswith("isrc:"):
+            value = resolved[id[5:]]
+            track_ids.append(json.loads(value)["id"] if value else None)
+        else:
+            try:
+                track_ids.append(int(id))
+            except ValueError:
+                track_ids.append(None)
+    return track_ids
+
+
+async def resolve_track_id(id: str) -> int:
+    """
+    Turns the `id` path parameter, either a track ID or an isrc prefixed with `isrc:`, into a track ID.
+    """
+    track_id = (await resolve_track_ids([id]))[0]
+    if track_id is None:
+        raise HTTPException(
+            status_code=404, detail="The track you specified could not be found."
+        )
+    return track_id
+
+
+def compact_lyrics(response: dict) -> CompactTrackLyricsResponse:
+    lines = [line for line in response.get("LYRICS_SYNC_JSON", []) if line["line"]]
+    return CompactTrackLyricsResponse(
+        text=response.get("LYRICS_TEXT", ""),
+        lines=[line["line"] for line in lines],
+        starts=[line["milliseconds"] for line in lines],
+        durations=[line["duration"] for line in lines],
+    )
+
+
+def expand_lyrics(lyrics: CompactTrackLyricsResponse) -> TrackLyricsResponse:
+    return TrackLyricsResponse(
+        text=lyrics.text,
+        lines=[
+            LyricLine(text=text, start=start, duration=duration)
+            for text, start, duration in zip(
+                lyrics.lines, lyrics.starts, lyrics.durations
+            )
+        ],
+    )
+
+
+async def get_track_lyrics(track_ids: List[int]) -> List[Optional[bytes]]:
+    """
+    Gets the compressed compact lyrics of several tracks, None for the ones without lyrics.
+    """
+
+    async def fetch(track_id: int) -> Optional[bytes]:
+        client = await sessions.get_client()
+        response = await client.get_lyrics(track_id)
+        if response and (
+            response.get("LYRICS_TEXT") or response.get("LYRICS_SYNC_JSON")
+        ):
+            return compress(compact_lyrics(response).json().encode("utf8"))
+
+    return await cached_many(
+        [
+            json.dumps(
+                {"endpoint": "/v1/track/lyrics", "id": id, "encoding": "compact"}
+            )
+            for id in track_ids
+        ],
+        track_ids,
+        fetch,
+        ex=track_lyrics_ttl,
+    )
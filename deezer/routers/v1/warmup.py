@@ -0,0 +1,17 @@
+import asyncio
+
+from deezer.core.config import redis_warm_connections, warmup_queries
+from deezer.core.redis import redis
+from deezer.routers.v1.sessions import sessions
+from deezer.routers.v1.utils import cached_search
+
+
+async def warmup() -> None:
+    """
+    Pays the cold start costs up front: opens Redis connections, authenticates the shared Deezer session and fills the cache for the configured queries.
+    """
+    await asyncio.gather(*[redis.ping() for _ in range(redis_warm_connections)])
+    await sessions.get_client()
+    await asyncio.gather(
+        *[cached_search(query, always_cache=True) for query in warmup_queries]
+    )
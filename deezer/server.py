@@ -1,18 +1,55 @@
-from fastapi import Depends, FastAPI
-from fastapi.responses import RedirectResponse
+import asyncio
+from contextlib import asynccontextmanager
 
-from deezer.core.auth import get_api_key
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, RedirectResponse
+
+from deezer.core.http import pools
+from deezer.core.redis import redis
+from deezer.core.timing import ServerTimingMiddleware
+from deezer.core.workers import workers
 from deezer.routers.v1 import router as v1_router
+from deezer.routers.v1 import websocket_router as v1_websocket_router
+from deezer.routers.v1.sessions import sessions
+from deezer.routers.v1.warmup import warmup
+
+
+async def warm_until_ready(app: FastAPI) -> None:
+    while True:
+        try:
+            await warmup()
+        except Exception as e:
+            print(f"Warmup failed, retrying in 5 seconds: {e!r}")
+            await asyncio.sleep(5)
+        else:
+            app.state.ready = True
+            return
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    warmup_task = asyncio.create_task(warm_until_ready(app))
+    yield
+    warmup_task.cancel()
+    sessions.reset()
+    await pools.close()
+    workers.close()
+    await redis.close()
 
+
+# Authentication is handled by the v1 router, so the health checks stay open for load balancers
 app = FastAPI(
     redoc_url=None,
-    dependencies=[Depends(get_api_key)],
     title="Deezer Proxy",
     version="1.0.6",
     description="A proxy for the Deezer API. It handles decryption, authentication, and documentation.",
+    lifespan=lifespan,
 )
 
+app.add_middleware(ServerTimingMiddleware)
 app.include_router(v1_router, prefix="/v1")
+app.include_router(v1_websocket_router, prefix="/v1")
 
 
 @app.get("/", include_in_schema=False)
@@ -20,4 +57,16 @@ async def root():
     return RedirectResponse(url="/docs")
 
 
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    return {"status": "ready"}
+
+
 from deezer.core.exceptions import *